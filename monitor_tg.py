@@ -1,13 +1,17 @@
 import asyncio
 import logging
 import re
+import time
+from collections import OrderedDict, deque
 import requests
 import cloudscraper
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
 from telethon.network.connection import ConnectionTcpFull
+from telethon.tl.types import MessageEntityTextUrl, MessageEntityUrl
 import os 
+from urllib.parse import urlsplit
 
 # Load environment variables
 load_dotenv()
@@ -33,69 +37,269 @@ if not API_ID or not API_HASH:
     logger.error("TG_API_ID or TG_API_HASH not found in .env file.")
     exit(1)
 
-def send_bot_message(text):
-    """Send message via Telegram Bot API"""
-    if not BOT_TOKEN or not BOT_CHAT_ID:
+# Proxy pool health checks, see the "proxy_check" section of config.json
+PROXY_CHECK_INTERVAL = 60       # seconds between probe rounds
+PROXY_CHECK_TIMEOUT = 10        # seconds before a probe counts as failed
+PROXY_CHECK_URL = 'https://api.telegram.org'
+PROXY_MAX_FAILURES = 2          # consecutive failures before a proxy is unhealthy
+PROXY_MAX_ATTEMPTS = 3          # proxies tried per HTTP request before giving up
+PROXY_LATENCY_SMOOTHING = 0.3   # weight of the newest probe in the latency average
+
+class Proxy:
+    """One outbound proxy with its health and latency stats"""
+    
+    def __init__(self, proxy_type, host, port):
+        self.type = proxy_type.lower()
+        self.host = host
+        self.port = int(port)
+        self.latency = None         # smoothed probe latency in seconds, None until probed
+        self.last_latency = None
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_check = None
+    
+    @classmethod
+    def from_url(cls, url):
+        """Parse a proxy URL like socks5://127.0.0.1:7897"""
+        parts = urlsplit(url.strip())
+        if not parts.scheme or not parts.hostname or not parts.port:
+            raise ValueError(f"Invalid proxy URL: {url}")
+        return cls(parts.scheme, parts.hostname, parts.port)
+    
+    @property
+    def url(self):
+        return f"{self.type}://{self.host}:{self.port}"
+    
+    @property
+    def healthy(self):
+        return self.consecutive_failures < PROXY_MAX_FAILURES
+    
+    def requests_proxies(self):
+        """Proxy dict for requests / cloudscraper"""
+        return {"http": self.url, "https": self.url}
+    
+    def telethon_proxy(self):
+        """Proxy dict for Telethon (using python-socks style)"""
+        if 'socks5' in self.type:
+            return {
+                'proxy_type': 'socks5',
+                'addr': self.host,
+                'port': self.port,
+                'rdns': True
+            }
+        elif 'socks4' in self.type:
+            return {
+                'proxy_type': 'socks4',
+                'addr': self.host,
+                'port': self.port
+            }
+        elif 'http' in self.type:
+            return {
+                'proxy_type': 'http',
+                'addr': self.host,
+                'port': self.port
+            }
+        return None
+    
+    def record_success(self, latency=None):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.last_error = None
+        if latency is not None:
+            self.last_latency = latency
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += PROXY_LATENCY_SMOOTHING * (latency - self.latency)
+    
+    def record_failure(self, error):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+    
+    def snapshot(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'latency': self.latency,
+            'last_latency': self.last_latency,
+            'successes': self.successes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error,
+            'last_check': self.last_check,
+        }
+
+
+class ProxyPool:
+    """
+    Proxies shared by the Bot API, scraping and MTProto paths. Background
+    probes keep per-proxy latency up to date; each outbound request picks
+    the fastest healthy proxy and fails over to the next one.
+    """
+    
+    def __init__(self, proxies=()):
+        self.proxies = list(proxies)
+    
+    def ranked(self):
+        """Healthy proxies fastest first (unprobed last), then unhealthy ones"""
+        return sorted(self.proxies, key=lambda p: (
+            not p.healthy,
+            p.consecutive_failures if not p.healthy else 0,
+            p.latency if p.latency is not None else float('inf'),
+        ))
+    
+    def best(self):
+        ranked = self.ranked()
+        return ranked[0] if ranked else None
+    
+    def probe(self, proxy):
+        """Time one request through proxy; any HTTP response counts as healthy"""
+        started = time.monotonic()
+        try:
+            requests.head(PROXY_CHECK_URL, proxies=proxy.requests_proxies(), timeout=PROXY_CHECK_TIMEOUT)
+        except Exception as e:
+            proxy.record_failure(e)
+            logger.warning(f"Proxy {proxy.url} failed health check: {e}")
+        else:
+            proxy.record_success(time.monotonic() - started)
+        proxy.last_check = time.time()
+    
+    async def check_all(self):
+        await asyncio.gather(*(asyncio.to_thread(self.probe, p) for p in self.proxies))
+    
+    def snapshot(self):
+        return [p.snapshot() for p in self.proxies]
+
+
+def is_proxy_failure(error, proxy, url):
+    """
+    Whether a requests error means the proxy itself is down or unreachable.
+    Errors caused by the target (DNS failure, site down or slow, read
+    timeouts) must not count against the proxy.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ProxyError):
+        # The proxy answered but could not reach the target
+        return 'Tunnel connection failed' not in str(error)
+    if isinstance(error, requests.exceptions.ConnectionError):
+        if 'socks' in proxy.type:
+            # urllib3 reports SOCKS connection failures as plain
+            # connection errors, never as ProxyError
+            return True
+        # Plain-http URLs go through an HTTP proxy without a tunnel, so the
+        # only connection is the one to the proxy
+        return urlsplit(url).scheme == 'http'
+    return False
+
+
+def request_with_failover(send, url, retry_read_timeout=False, **kwargs):
+    """
+    Run send(url, proxies=..., **kwargs) through the fastest healthy proxy,
+    retrying through the next one only when the proxy itself failed (see
+    is_proxy_failure). With retry_read_timeout, a read timeout is also
+    blamed on the proxy and retried; only use it where the target is known
+    to be fast, as a slow site would otherwise cost every proxy a failure.
+    Any other error is raised right away without being recorded against
+    the proxy, and HTTP error responses are returned as-is.
+    Without any proxy configured the request goes out directly.
+    """
+    candidates = PROXY_POOL.ranked()[:PROXY_MAX_ATTEMPTS]
+    if not candidates:
+        return send(url, proxies=None, **kwargs)
+    
+    last_error = None
+    for proxy in candidates:
+        try:
+            response = send(url, proxies=proxy.requests_proxies(), **kwargs)
+        except requests.exceptions.RequestException as e:
+            read_timeout = retry_read_timeout and isinstance(e, requests.exceptions.ReadTimeout)
+            if not read_timeout and not is_proxy_failure(e, proxy, url):
+                raise
+            proxy.record_failure(e)
+            logger.warning(f"Request via proxy {proxy.url} failed: {e}")
+            last_error = e
+            continue
+        proxy.record_success()
+        return response
+    raise last_error
+
+
+def load_proxy_settings(config):
+    """
+    Read the proxy pool from config.json ("proxies": list of proxy URLs) and
+    probe settings from "proxy_check". Falls back to the single
+    TG_PROXY_* proxy from .env when no list is configured.
+    """
+    global PROXY_CHECK_INTERVAL, PROXY_CHECK_TIMEOUT, PROXY_CHECK_URL
+    check_conf = config.get('proxy_check', {}) or {}
+    try:
+        PROXY_CHECK_INTERVAL = max(5, int(check_conf.get('interval', PROXY_CHECK_INTERVAL)))
+        PROXY_CHECK_TIMEOUT = max(1, int(check_conf.get('timeout', PROXY_CHECK_TIMEOUT)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid proxy_check settings: {check_conf}, using defaults")
+    PROXY_CHECK_URL = check_conf.get('url', PROXY_CHECK_URL)
+    
+    proxies = []
+    for url in config.get('proxies', []) or []:
+        try:
+            proxies.append(Proxy.from_url(url))
+        except ValueError as e:
+            logger.error(f"{e}, skipping.")
+    if proxies:
+        PROXY_POOL.proxies = proxies
+    logger.info(f"Proxy pool: {[p.url for p in PROXY_POOL.proxies] or 'direct connection'}")
+
+
+def send_bot_message(text, chat_id=None):
+    """Send message via Telegram Bot API (to TELEGRAM_CHAT_ID unless chat_id is given)"""
+    chat_id = chat_id or BOT_CHAT_ID
+    if not BOT_TOKEN or not chat_id:
         logger.warning("Bot Token or Chat ID not set. Skipping notification.")
         return
 
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    
-    # Build proxy dict for requests
-    proxies = None
-    if PROXY_HOST and PROXY_PORT:
-        proxy_url = f"{PROXY_TYPE}://{PROXY_HOST}:{PROXY_PORT}"
-        proxies = {"http": proxy_url, "https": proxy_url}
 
     try:
         payload = {
-            "chat_id": BOT_CHAT_ID,
+            "chat_id": chat_id,
             "text": text,
             "parse_mode": "HTML",
             # Enable native Telegram link preview
             "disable_web_page_preview": False
         }
-        resp = requests.post(url, json=payload, proxies=proxies, timeout=10)
+        # Goes through the fastest healthy proxy, failing over if it is down.
+        # api.telegram.org answers quickly, so a read timeout means a slow
+        # proxy: retry through the next one. sendMessage is not idempotent,
+        # so this can rarely send an alert twice, which beats losing it.
+        resp = request_with_failover(requests.post, url, retry_read_timeout=True, json=payload, timeout=10)
         resp.raise_for_status()
-        logger.info("Notification sent to Telegram Bot.")
+        logger.info(f"Notification sent to Telegram Bot (chat {chat_id}).")
     except Exception as e:
         logger.error(f"Failed to send bot notification: {e}")
 
-# Build proxy dict for Telethon (using python-socks style)
-proxy = None
+# Proxy from .env, used until config.json is loaded (and as the pool if it lists none)
+PROXY_POOL = ProxyPool()
 if PROXY_HOST and PROXY_PORT:
     try:
-        port = int(PROXY_PORT)
-        if 'socks5' in PROXY_TYPE:
-            proxy = {
-                'proxy_type': 'socks5',
-                'addr': PROXY_HOST,
-                'port': port,
-                'rdns': True
-            }
-        elif 'socks4' in PROXY_TYPE:
-            proxy = {
-                'proxy_type': 'socks4',
-                'addr': PROXY_HOST,
-                'port': port
-            }
-        elif 'http' in PROXY_TYPE:
-            proxy = {
-                'proxy_type': 'http',
-                'addr': PROXY_HOST,
-                'port': port
-            }
-        logger.info(f"Using Proxy: {PROXY_TYPE}://{PROXY_HOST}:{port}")
+        PROXY_POOL.proxies.append(Proxy(PROXY_TYPE or 'http', PROXY_HOST, PROXY_PORT))
+        logger.info(f"Using Proxy: {PROXY_TYPE}://{PROXY_HOST}:{PROXY_PORT}")
     except ValueError:
         logger.error("Invalid Proxy Port")
         exit(1)
 
+# Proxy the MTProto connection currently goes through
+MTPROTO_PROXY = PROXY_POOL.best()
+
 # Initialize Client
 client = TelegramClient(
     'anon',
     int(API_ID),
     API_HASH,
-    proxy=proxy
+    proxy=MTPROTO_PROXY.telethon_proxy() if MTPROTO_PROXY else None
 )
 
 def fetch_url_preview(url, max_lines=5):
@@ -104,14 +308,8 @@ def fetch_url_preview(url, max_lines=5):
         # Create cloudscraper session (automatically bypasses Cloudflare)
         scraper = cloudscraper.create_scraper()
         
-        # Build proxy dict
-        proxies = None
-        if PROXY_HOST and PROXY_PORT:
-            proxy_url = f"{PROXY_TYPE}://{PROXY_HOST}:{PROXY_PORT}"
-            proxies = {"http": proxy_url, "https": proxy_url}
-        
-        # Fetch content
-        response = scraper.get(url, proxies=proxies, timeout=15)
+        # Fetch content through the fastest healthy proxy
+        response = request_with_failover(scraper.get, url, timeout=15)
         response.raise_for_status()
         
         # Parse HTML and extract text
@@ -173,29 +371,104 @@ def fetch_url_preview(url, max_lines=5):
 
 import json
 
-# Global to store channel-specific configs (id -> keywords)
+# Global to store channel-specific compiled matchers (event chat id -> KeywordMatcher)
 CHANNEL_CONFIGS = {}
 
-def load_channel_config():
-    """Load channel configuration from json file"""
+# Global to store subscriber chat ids (subscriber name -> chat id)
+SUBSCRIBERS = {}
+
+# Keywords listed directly on a channel belong to this subscriber,
+# who is notified at TELEGRAM_CHAT_ID
+DEFAULT_SUBSCRIBER = 'default'
+
+# Album / edit coalescing, see the "coalesce" section of config.json
+ALBUM_WAIT = 1.0            # seconds to collect the rest of an album
+HANDLE_EDITS = False        # re-evaluate edited posts whose first line changed
+SEEN_POSTS_LIMIT = 2048     # posts remembered for edit comparison
+
+# Albums being collected: (chat id, grouped id) -> {'messages': [...], 'task': Task}
+PENDING_ALBUMS = {}
+# Recently evaluated posts, oldest first: post key -> {'title': str, 'messages': {msg id: Message}}
+SEEN_POSTS = OrderedDict()
+
+def load_config():
+    """Load the whole config.json file"""
     try:
         with open('config.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data.get('channels', [])
+            return json.load(f)
     except Exception as e:
         logger.error(f"Failed to load config.json: {e}")
-        return []
+        return {}
+
+def load_coalesce_settings(config):
+    """Read album wait time and edit handling from the "coalesce" section of config.json"""
+    coalesce_conf = config.get('coalesce', {}) or {}
+    album_wait = ALBUM_WAIT
+    try:
+        album_wait = max(0.0, float(coalesce_conf.get('album_wait', ALBUM_WAIT)))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid coalesce.album_wait: {coalesce_conf.get('album_wait')!r}, using {ALBUM_WAIT}")
+    return album_wait, bool(coalesce_conf.get('edits', HANDLE_EDITS))
+
+def load_subscriptions(config):
+    """
+    Build the subscriber model from config.json.
+    
+    Returns (channel id -> {subscriber: keywords}, subscriber -> chat id).
+    Besides the default subscriber, each entry of "subscribers" looks like:
+        {"name": "alice", "chat_id": "123456", "enabled": true,
+         "channels": {"nodeseekc": ["特价", "[body]补货"]}}
+    """
+    subscriptions = {}
+    chat_ids = {DEFAULT_SUBSCRIBER: BOT_CHAT_ID}
+    
+    for conf in config.get('channels', []):
+        if not conf.get('enabled', True):
+            continue
+        subscriptions.setdefault(conf['id'], {})[DEFAULT_SUBSCRIBER] = conf.get('keywords', [])
+    
+    for sub in config.get('subscribers', []):
+        if not sub.get('enabled', True):
+            continue
+        chat_id = str(sub.get('chat_id', '')).strip()
+        name = str(sub.get('name') or chat_id).strip()
+        if not chat_id:
+            logger.warning(f"Subscriber '{name}' has no chat_id, skipping.")
+            continue
+        if name in chat_ids:
+            logger.warning(f"Duplicate subscriber name '{name}', skipping.")
+            continue
+        chat_ids[name] = chat_id
+        for channel_id, keywords in (sub.get('channels') or {}).items():
+            if channel_id not in subscriptions:
+                logger.warning(f"Subscriber '{name}' uses channel {channel_id} which is unknown or disabled, ignoring.")
+                continue
+            subscriptions[channel_id][name] = keywords
+    
+    return subscriptions, chat_ids
 
 async def main():
-    channels_conf = load_channel_config()
+    config = load_config()
+    channels_conf = config.get('channels', [])
     target_chats_ids = []
     
     # Reset global config map
-    global CHANNEL_CONFIGS
+    global CHANNEL_CONFIGS, SUBSCRIBERS, MATCH_LIMITS, ALBUM_WAIT, HANDLE_EDITS, MTPROTO_PROXY
     CHANNEL_CONFIGS = {}
+    MATCH_LIMITS = load_match_limits(config)
+    ALBUM_WAIT, HANDLE_EDITS = load_coalesce_settings(config)
+    subscriptions, SUBSCRIBERS = load_subscriptions(config)
     
     logger.info(f"Loaded {len(channels_conf)} channel configs from settings.")
     
+    # Probe the proxy pool once so MTProto starts on the fastest healthy proxy
+    load_proxy_settings(config)
+    if PROXY_POOL.proxies:
+        await PROXY_POOL.check_all()
+        MTPROTO_PROXY = PROXY_POOL.best()
+        client.set_proxy(MTPROTO_PROXY.telethon_proxy())
+        logger.info(f"MTProto proxy: {MTPROTO_PROXY.url}")
+    
     await client.start()
     
     # Resolve channel entities and build config map
@@ -206,7 +479,10 @@ async def main():
             continue
             
         chat_id_or_name = conf['id']
-        keywords = conf.get('keywords', [])
+        default_scope = str(conf.get('scope', 'title')).lower()
+        if default_scope not in MATCH_SCOPES:
+            logger.warning(f"Invalid scope '{default_scope}' for channel {chat_id_or_name}, using 'title'")
+            default_scope = 'title'
         
         try:
             # Try to resolve the entity
@@ -228,10 +504,10 @@ async def main():
             valid_chats.append(entity.id)
             target_chats_ids.append(entity.id)
             
-            # Store keywords using the EVENT format ID (with -100 prefix)
-            CHANNEL_CONFIGS[event_chat_id] = [k.strip() for k in keywords if k.strip()]
+            # Store the compiled matcher (all subscribers of this channel) using the EVENT format ID (with -100 prefix)
+            CHANNEL_CONFIGS[event_chat_id] = KeywordMatcher(subscriptions[chat_id_or_name], default_scope, name=chat_id_or_name)
             
-            logger.info(f"Monitoring: {getattr(entity, 'title', chat_id_or_name)} (ID: {entity.id}) | Keywords: {CHANNEL_CONFIGS[event_chat_id]}")
+            logger.info(f"Monitoring: {getattr(entity, 'title', chat_id_or_name)} (ID: {entity.id}) | Keywords: {CHANNEL_CONFIGS[event_chat_id].describe()}")
             
         except Exception as e:
             logger.error(f"Failed to resolve channel {chat_id_or_name}: {e}")
@@ -256,48 +532,204 @@ async def main():
     
     # Better approach: Remove the decorator usage at module level and add_event_handler inside main.
     client.add_event_handler(handler, events.NewMessage(chats=valid_chats))
+    if HANDLE_EDITS:
+        client.add_event_handler(edit_handler, events.MessageEdited(chats=valid_chats))
+    
+    # Keep per-keyword stats across restarts and publish them for the web console
+    load_match_stats(CHANNEL_CONFIGS.values())
+    asyncio.create_task(flush_match_stats())
+    
+    # Keep proxy latency up to date and move MTProto off failing proxies
+    if PROXY_POOL.proxies:
+        asyncio.create_task(monitor_proxies())
 
     logger.info("Connected! Waiting for messages...")
-    await client.run_until_disconnected()
+    await run_mtproto()
+
+async def monitor_proxies():
+    """Probe all proxies periodically; drop the MTProto connection if its proxy turns unhealthy"""
+    while True:
+        await asyncio.sleep(PROXY_CHECK_INTERVAL)
+        await PROXY_POOL.check_all()
+        best = PROXY_POOL.best()
+        if MTPROTO_PROXY is not None and not MTPROTO_PROXY.healthy and best.healthy:
+            logger.warning(f"MTProto proxy {MTPROTO_PROXY.url} is unhealthy, switching to {best.url}")
+            # run_mtproto() reconnects through the best proxy
+            await client.disconnect()
+
+async def run_mtproto():
+    """Run until disconnected, reconnecting through the fastest healthy proxy each time"""
+    global MTPROTO_PROXY
+    while True:
+        # Only wait on a live connection: on a disconnected client
+        # run_until_disconnected() raises on its first request
+        if client.is_connected():
+            try:
+                await client.run_until_disconnected()
+            except Exception as e:
+                # Telethon gave up reconnecting on its own and raised
+                # ConnectionError through the disconnected future
+                logger.error(f"MTProto connection lost: {e}")
+                if MTPROTO_PROXY is not None:
+                    MTPROTO_PROXY.record_failure(e)
+        
+        if not PROXY_POOL.proxies:
+            # Direct connection: keep the old behaviour and exit
+            return
+        
+        MTPROTO_PROXY = PROXY_POOL.best()
+        logger.warning(f"MTProto disconnected, reconnecting via {MTPROTO_PROXY.url}")
+        client.set_proxy(MTPROTO_PROXY.telethon_proxy())
+        try:
+            await client.connect()
+        except Exception as e:
+            MTPROTO_PROXY.record_failure(e)
+            logger.error(f"Failed to reconnect via {MTPROTO_PROXY.url}: {e}")
+            await asyncio.sleep(5)
 
 # Remove module-level decorator and check manually
 async def handler(event):
-    message_text = event.message.message
+    message = event.message
+    message_text = message.message
     
     # DEBUG: Log every message received
     logger.info(f"[DEBUG] Received message from chat_id={event.chat_id}: {message_text[:50] if message_text else 'NO TEXT'}...")
     
-    if not message_text:
+    # Album parts arrive as separate messages sharing a grouped_id;
+    # collect them briefly so the album is evaluated once
+    if message.grouped_id:
+        queue_album_message(event.chat_id, message)
         return
+    
+    await process_post(event.chat_id, [message])
+
 
-    # Check which channel this came from
-    chat_id = event.chat_id
+async def edit_handler(event):
+    """Re-evaluate an edited post, but only if its first line changed"""
+    message = event.message
     
-    # Get keywords for this channel
-    keywords = CHANNEL_CONFIGS.get(chat_id, [])
+    # An album still being collected just picks up the edited part
+    pending = PENDING_ALBUMS.get((event.chat_id, message.grouped_id)) if message.grouped_id else None
+    if pending is not None:
+        pending['messages'] = [m for m in pending['messages'] if m.id != message.id] + [message]
+        return
+    
+    key = post_key(event.chat_id, message)
+    seen = SEEN_POSTS.get(key)
+    if seen is None:
+        # Posted before the monitor started, or too long ago to compare
+        return
+    
+    parts = dict(seen['messages'])
+    parts[message.id] = message
+    messages = [parts[msg_id] for msg_id in sorted(parts)]
+    
+    if post_title(merge_post_text(messages)) == seen['title']:
+        logger.info(f"[DEBUG] Ignoring edit of message {message.id} in chat_id={event.chat_id}: first line unchanged")
+        return
+    
+    logger.info(f"[DEBUG] Re-evaluating edited message {message.id} in chat_id={event.chat_id}")
+    await process_post(event.chat_id, messages)
+
+
+def queue_album_message(chat_id, message):
+    """Buffer an album part; the first part schedules evaluation of the whole album"""
+    key = (chat_id, message.grouped_id)
+    pending = PENDING_ALBUMS.get(key)
+    if pending is None:
+        PENDING_ALBUMS[key] = {
+            'messages': [message],
+            'task': asyncio.create_task(flush_album(key)),
+        }
+    else:
+        pending['messages'].append(message)
+
+
+async def flush_album(key):
+    """Evaluate a buffered album once its wait time is over"""
+    await asyncio.sleep(ALBUM_WAIT)
+    pending = PENDING_ALBUMS.pop(key, None)
+    if pending is None:
+        return
+    messages = sorted(pending['messages'], key=lambda m: m.id)
+    logger.info(f"[DEBUG] Coalesced album {key[1]} in chat_id={key[0]}: {len(messages)} messages")
+    try:
+        await process_post(key[0], messages)
+    except Exception as e:
+        # Runs outside Telethon's handler, so nobody else would log this
+        logger.error(f"Failed to process album {key[1]} in chat_id={key[0]}: {e}")
+
+
+def post_key(chat_id, message):
+    """Albums are tracked by grouped_id, other posts by message id"""
+    if message.grouped_id:
+        return (chat_id, 'album', message.grouped_id)
+    return (chat_id, 'message', message.id)
+
+
+def merge_post_text(messages):
+    """Join the non-empty texts/captions of a post's messages"""
+    return '\n'.join(m.message for m in messages if m.message)
+
+
+def post_title(text):
+    return extract_segments(text, needed=('title',))['title']
+
+
+def remember_post(chat_id, messages, message_text):
+    """Keep the first line of an evaluated post so edits can be compared against it"""
+    key = post_key(chat_id, messages[0])
+    SEEN_POSTS[key] = {
+        'title': post_title(message_text),
+        # Album parts are kept so an edited caption can be re-merged
+        'messages': {m.id: m for m in messages} if messages[0].grouped_id else {},
+    }
+    SEEN_POSTS.move_to_end(key)
+    while len(SEEN_POSTS) > SEEN_POSTS_LIMIT:
+        SEEN_POSTS.popitem(last=False)
+
+
+async def process_post(chat_id, messages):
+    """Evaluate one post (a single message or a coalesced album) and notify subscribers"""
+    message_text = merge_post_text(messages)
+    
+    if HANDLE_EDITS:
+        remember_post(chat_id, messages, message_text)
+    
+    if not message_text:
+        return
+
+    # Get compiled keywords for this channel
+    matcher = CHANNEL_CONFIGS.get(chat_id)
     
     # If no config found, skip
-    if chat_id not in CHANNEL_CONFIGS:
+    if matcher is None:
         logger.warning(f"[DEBUG] chat_id {chat_id} not in CHANNEL_CONFIGS. Available: {list(CHANNEL_CONFIGS.keys())}")
         return
 
-    # Extract first line (title) for keyword matching
-    # This prevents false positives from content inside code blocks
-    first_line = message_text.split('\n')[0] if message_text else ''
+    # Only extract the segments this channel's keywords are scoped to.
+    # By default that is just the first line (title), which prevents false
+    # positives from content inside code blocks
+    started = time.perf_counter()
+    entities_text = None
+    if 'url' in matcher.segments:
+        entities_text = [pair for m in messages for pair in m.get_entities_text()]
+    segments = extract_segments(message_text, entities_text, matcher.segments)
     
-    # Check for matched keywords using advanced matching (only on title)
-    matched_keyword = match_keywords(first_line, keywords)
+    # Check for matched keywords of all subscribers in one pass over the needed segments
+    costs = {}
+    hits = matcher.scan(segments, costs)
+    recipients = matcher.resolve(hits)
+    MATCH_STATS.record_scan(matcher, hits, costs, started, recipients)
             
-    if matched_keyword:
-        logger.info(f"Keyword matched: {matched_keyword}")
+    if recipients:
+        logger.info(f"Keyword matched: {recipients}")
         try:
             # Parse message and extract the main link
-            parsed = parse_message_format(message_text, event.message.entities)
+            parsed = parse_message_format(message_text, [e for m in messages for e in (m.entities or [])])
             
-            # Prepare notification
+            # Prepare notification (the keyword line is added per recipient)
             output_lines = []
-            output_lines.append(f"🔔 <b>关键词监控通知</b>")
-            output_lines.append(f"#{matched_keyword}")
             
             if parsed['main_url']:
                 # Format with clickable title
@@ -317,15 +749,27 @@ async def handler(event):
             
             # Terminal output
             print(f"\n========== MATCHED MESSAGE ==========")
-            print(f"KEYWORD: {matched_keyword}")
+            print(f"KEYWORDS: {recipients}")
             print(f"TITLE: {parsed.get('title', 'N/A')}")
             print(f"MAIN URL: {parsed.get('main_url', 'N/A')}")
             print(f"CONTENT:\n{message_text[:200]}...")
             print(f"=====================================\n", flush=True)
             
-            # Send notification via Bot
-            full_message = "\n".join(output_lines)
-            await asyncio.to_thread(send_bot_message, full_message)
+            # One notification per chat; subscribers sharing a chat get the
+            # keyword of the first of them in config order
+            deliveries = {}
+            for subscriber, keyword in recipients.items():
+                deliveries.setdefault(SUBSCRIBERS.get(subscriber), keyword)
+            
+            # Send notifications via Bot concurrently
+            await asyncio.gather(*(
+                asyncio.to_thread(
+                    send_bot_message,
+                    "\n".join([f"🔔 <b>关键词监控通知</b>", f"#{keyword}"] + output_lines),
+                    chat_id
+                )
+                for chat_id, keyword in deliveries.items()
+            ))
             
         except Exception as e:
             logger.error(f"Failed to process message: {e}")
@@ -336,102 +780,567 @@ def html_escape(text):
     return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 
-def match_keywords(text, keywords):
+# Keyword scopes: which part of a message a keyword is matched against.
+# 'title' is the first line, 'body' everything after it, 'url' the link text
+# and hidden URLs of link entities, 'any' all three.
+MATCH_SCOPES = ('title', 'body', 'url', 'any')
+SEGMENTS = ('title', 'body', 'url')
+
+# Per-keyword scope prefix, e.g. "[body]出" or "[url]nodeseek.com"
+SCOPE_PREFIX_PATTERN = re.compile(r'^\[(title|body|url|any)\]\s*', re.IGNORECASE)
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]')
+
+# Length caps (characters) applied to each segment before matching.
+# None means unlimited; the title is unlimited by default so the whole
+# first line is matched, as it always was
+DEFAULT_MATCH_LIMITS = {
+    'title': None,
+    'body': 4096,
+    'url': 2048,
+}
+MATCH_LIMITS = dict(DEFAULT_MATCH_LIMITS)
+
+
+def load_match_limits(data):
+    """Read segment length caps from the "match" section of config.json (0 = unlimited)"""
+    limits = dict(DEFAULT_MATCH_LIMITS)
+    match_conf = data.get('match', {}) or {}
+    for segment in SEGMENTS:
+        value = match_conf.get(f'max_{segment}_length')
+        if value is None:
+            continue
+        try:
+            limits[segment] = max(0, int(value)) or None
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid match.max_{segment}_length: {value!r}, using {limits[segment]}")
+    return limits
+
+
+def parse_keyword(raw, default_scope='title'):
     """
-    Advanced keyword matching with support for:
-    1. Whole word matching for English/alphanumeric (using word boundaries)
-    2. Exclusion keywords with '-' prefix (e.g., '-air' excludes messages containing 'air')
-    3. Regex patterns with '/pattern/' syntax (e.g., '/\bAI\b/')
+    Parse a keyword string from config.json into a keyword spec.
     
-    For Chinese keywords, uses simple substring matching (no word boundary concept).
+    Supports:
+    - Scope prefix: [title] / [body] / [url] / [any] (defaults to the channel scope)
+    - Exclusion keywords with '-' prefix (e.g., '-air')
+    - Regex patterns: /pattern/  or  /pattern/i (case insensitive)
+    - Whole word matching for alphanumeric keywords
+    - Substring matching for CJK (Chinese/Japanese/Korean) keywords
     
-    Returns the first matched keyword, or None if no match.
+    Returns a dict, or None for empty/invalid keywords.
     """
-    text_lower = text.lower()
+    keyword = raw.strip()
+    scope = default_scope
     
-    # Separate exclusion keywords and positive keywords
-    exclusions = []
-    positive_keywords = []
+    prefix = SCOPE_PREFIX_PATTERN.match(keyword)
+    if prefix:
+        scope = prefix.group(1).lower()
+        keyword = keyword[prefix.end():]
     
-    for kw in keywords:
-        kw = kw.strip()
-        if not kw:
-            continue
-        if kw.startswith('-'):
-            # Exclusion keyword
-            exclusions.append(kw[1:].strip())
-        else:
-            positive_keywords.append(kw)
+    exclude = False
+    if keyword.startswith('-'):
+        exclude = True
+        keyword = keyword[1:].strip()
     
-    # First, check exclusions - if ANY exclusion matches, skip this message entirely
-    for excl in exclusions:
-        if is_keyword_match(text, text_lower, excl):
+    if not keyword:
+        return None
+    
+    spec = {
+        'label': keyword,
+        'scope': scope,
+        'exclude': exclude,
+    }
+    
+    # Check if it's a regex pattern
+    if keyword.startswith('/') and keyword.rfind('/') > 0:
+        last_slash = keyword.rfind('/')
+        pattern = keyword[1:last_slash]
+        flags_str = keyword[last_slash+1:]
+        
+        # Parse flags
+        flags = 0
+        if 'i' in flags_str:
+            flags |= re.IGNORECASE
+        if 's' in flags_str:
+            flags |= re.DOTALL
+        if 'm' in flags_str:
+            flags |= re.MULTILINE
+        
+        try:
+            spec['regex'] = re.compile(pattern, flags)
+        except re.error as e:
+            logger.warning(f"Invalid regex pattern '{pattern}': {e}")
             return None
+        spec['kind'] = 'regex'
+        spec['key'] = (scope, exclude, 'regex', pattern, flags)
+        return spec
     
-    # Then check positive keywords
-    for kw in positive_keywords:
-        if is_keyword_match(text, text_lower, kw):
-            return kw
+    # For CJK, use simple substring matching; for alphanumeric, use word
+    # boundary matching so 'AI' matches 'AI' but not 'air' or 'fair'
+    spec['kind'] = 'substr' if CJK_PATTERN.search(keyword) else 'word'
+    spec['text'] = keyword.lower()
+    spec['key'] = (scope, exclude, spec['kind'], spec['text'])
+    return spec
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+def _at_word_boundary(text, pos):
+    """Same semantics as a regex word boundary (\\b) at position pos"""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < len(text) and _is_word_char(text[pos])
+    return before != after
+
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over lowercased literal keywords.
+    
+    Finds every occurrence of every keyword in one left-to-right scan,
+    so the cost per message no longer grows with the number of keywords.
+    """
     
-    return None
+    def __init__(self, patterns):
+        # patterns: list of (pattern_id, lowercased text)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        
+        for pid, word in patterns:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    self.goto[node][ch] = nxt
+                node = nxt
+            self.out[node] = self.out[node] + ((pid, len(word)),)
+        
+        # Breadth-first pass to build failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+    
+    def finditer(self, text):
+        """Yield (pattern_id, start, end) for every occurrence in text"""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pid, length in out[node]:
+                yield pid, end - length, end
 
 
-def is_keyword_match(text, text_lower, keyword):
+class KeywordMatcher:
     """
-    Check if a single keyword matches the text.
+    The keywords of every subscriber on a channel, compiled for
+    single-pass matching.
     
-    Supports:
-    - Regex patterns: /pattern/  or  /pattern/i (case insensitive)
-    - Whole word matching for alphanumeric keywords
-    - Substring matching for CJK (Chinese/Japanese/Korean) keywords
+    Literal keywords of every scope are folded into one automaton per
+    message segment, so each segment is scanned exactly once; regex
+    keywords are precompiled and run against their segment only.
+    Keywords shared by several subscribers are compiled once, and an
+    inverted index maps each keyword back to the subscribers using it.
     """
-    keyword = keyword.strip()
     
-    # Check if it's a regex pattern
-    if keyword.startswith('/') and ('/' in keyword[1:]):
-        # Extract regex pattern
-        last_slash = keyword.rfind('/')
-        if last_slash > 0:
-            pattern = keyword[1:last_slash]
-            flags_str = keyword[last_slash+1:]
-            
-            # Parse flags
-            flags = 0
-            if 'i' in flags_str:
-                flags |= re.IGNORECASE
-            if 's' in flags_str:
-                flags |= re.DOTALL
-            if 'm' in flags_str:
-                flags |= re.MULTILINE
-            
-            try:
-                if re.search(pattern, text, flags):
-                    return True
-            except re.error as e:
-                logger.warning(f"Invalid regex pattern '{pattern}': {e}")
-            return False
+    def __init__(self, subscriptions, default_scope='title', name=None):
+        # subscriptions: subscriber name -> keyword list
+        self.name = name        # channel name used for stats
+        self.patterns = []      # unique keyword specs, index = pattern id
+        self.rules = {}         # subscriber -> {'include': [pid, ...], 'exclude': [pid, ...]}
+        self.index = {}         # pattern id -> subscribers using it (inverted index)
+        self._order = {}        # subscriber -> config position, for stable output
+        
+        seen = {}
+        for subscriber, keywords in subscriptions.items():
+            self._order[subscriber] = len(self._order)
+            rule = self.rules[subscriber] = {'include': [], 'exclude': []}
+            for raw in keywords:
+                spec = parse_keyword(raw, default_scope)
+                if spec is None:
+                    continue
+                pid = seen.get(spec['key'])
+                if pid is None:
+                    pid = seen[spec['key']] = len(self.patterns)
+                    self.patterns.append(spec)
+                    self.index[pid] = []
+                target = rule['exclude'] if spec['exclude'] else rule['include']
+                if pid not in target:
+                    target.append(pid)
+                    self.index[pid].append(subscriber)
+        
+        literals = {segment: [] for segment in SEGMENTS}
+        self._regexes = {segment: [] for segment in SEGMENTS}
+        for pid, spec in enumerate(self.patterns):
+            segments = SEGMENTS if spec['scope'] == 'any' else (spec['scope'],)
+            for segment in segments:
+                if spec['kind'] == 'regex':
+                    self._regexes[segment].append((pid, spec['regex']))
+                else:
+                    literals[segment].append((pid, spec['text']))
+        
+        self._automata = {
+            segment: _Automaton(words) for segment, words in literals.items() if words
+        }
+        # Segments this matcher actually needs extracted from a message
+        self.segments = frozenset(
+            segment for segment in SEGMENTS
+            if segment in self._automata or self._regexes[segment]
+        )
+        
+        # Stats keys, built once: one per keyword, plus one per automaton
+        # pass since that time is shared by all literal keywords of a segment
+        self.stat_keys = [self.pattern_name(pid) for pid in range(len(self.patterns))]
+        self.scan_stat_keys = {segment: f"<scan:{segment}>" for segment in self._automata}
     
-    keyword_lower = keyword.lower()
+    def pattern_name(self, pid):
+        """Keyword as written in config, with its effective scope"""
+        spec = self.patterns[pid]
+        prefix = '-' if spec['exclude'] else ''
+        return f"[{spec['scope']}]{prefix}{spec['label']}"
     
-    # Check if keyword is primarily CJK (Chinese/Japanese/Korean)
-    cjk_pattern = re.compile(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]')
-    is_cjk = bool(cjk_pattern.search(keyword))
+    def describe(self):
+        """Human readable keyword lists per subscriber for logging"""
+        return {
+            subscriber: [self.pattern_name(pid) for pid in rule['exclude'] + rule['include']]
+            for subscriber, rule in self.rules.items()
+        }
     
-    if is_cjk:
-        # For CJK, use simple substring matching
-        return keyword_lower in text_lower
-    else:
-        # For alphanumeric, use word boundary matching
-        # This ensures 'AI' matches 'AI' but not 'air' or 'fair'
-        try:
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-        except re.error:
-            # Fallback to simple matching if regex fails
-            return keyword_lower in text_lower
+    def scan(self, segments, costs=None):
+        """
+        Return the set of pattern ids found in the given message segments.
+        
+        If costs is a dict, the time spent is added to it: keyed by segment
+        name for the shared automaton pass, by pattern id for each regex.
+        """
+        hits = set()
+        for segment, text in segments.items():
+            if not text:
+                continue
+            automaton = self._automata.get(segment)
+            if automaton is not None:
+                started = time.perf_counter()
+                lowered = text.lower()
+                for pid, start, end in automaton.finditer(lowered):
+                    if pid in hits:
+                        continue
+                    if self.patterns[pid]['kind'] == 'word' and not (
+                        _at_word_boundary(lowered, start) and _at_word_boundary(lowered, end)
+                    ):
+                        continue
+                    hits.add(pid)
+                if costs is not None:
+                    costs[segment] = costs.get(segment, 0.0) + time.perf_counter() - started
+            for pid, regex in self._regexes[segment]:
+                if pid in hits:
+                    continue
+                started = time.perf_counter()
+                if regex.search(text):
+                    hits.add(pid)
+                if costs is not None:
+                    costs[pid] = costs.get(pid, 0.0) + time.perf_counter() - started
+        return hits
     
-    return False
+    def resolve(self, hits):
+        """
+        Map a set of pattern ids returned by scan() to {subscriber: keyword}
+        for every subscriber to notify. Each subscriber gets their first
+        matched keyword (in config order), and is skipped if any of their
+        exclusion keywords matched.
+        """
+        if not hits:
+            return {}
+        candidates = set()
+        excluded = set()
+        for pid in hits:
+            if self.patterns[pid]['exclude']:
+                excluded.update(self.index[pid])
+            else:
+                candidates.update(self.index[pid])
+        
+        recipients = {}
+        for subscriber in sorted(candidates - excluded, key=self._order.get):
+            for pid in self.rules[subscriber]['include']:
+                if pid in hits:
+                    recipients[subscriber] = self.patterns[pid]['label']
+                    break
+        return recipients
+
+
+def extract_segments(text, entities_text=None, needed=SEGMENTS):
+    """
+    Slice a message into the segments a matcher needs, applying MATCH_LIMITS.
+    
+    The title is cut at the first newline without splitting the whole
+    message into lines. entities_text is the list of (entity, text) pairs
+    from Message.get_entities_text(), used for the 'url' segment.
+    """
+    segments = {}
+    if not text:
+        text = ''
+    
+    if 'title' in needed:
+        cap = MATCH_LIMITS['title']
+        newline = text.find('\n', 0, cap)
+        segments['title'] = text[:newline] if newline != -1 else text[:cap]
+    
+    if 'body' in needed:
+        newline = text.find('\n')
+        if newline == -1:
+            segments['body'] = ''
+        else:
+            cap = MATCH_LIMITS['body']
+            segments['body'] = text[newline + 1:newline + 1 + cap if cap is not None else None]
+    
+    if 'url' in needed:
+        parts = []
+        for entity, entity_text in entities_text or ():
+            if isinstance(entity, MessageEntityTextUrl):
+                parts.append(entity_text)
+                parts.append(entity.url)
+            elif isinstance(entity, MessageEntityUrl):
+                parts.append(entity_text)
+        segments['url'] = '\n'.join(parts)[:MATCH_LIMITS['url']]
+    
+    return segments
+
+
+# Rollup resolutions for match stats: (name, bucket width in seconds, buckets kept)
+STATS_ROLLUPS = (
+    ('minute', 60, 60),
+    ('hour', 3600, 24),
+    ('day', 86400, 30),
+)
+STATS_FILE = 'stats.json'
+STATS_FLUSH_INTERVAL = 30
+# Stats key for a channel's totals (all keywords together)
+CHANNEL_TOTAL = '*'
+
+
+class RollupSeries:
+    """
+    Fixed-size ring buffer of time buckets, each holding
+    [evaluations, hits, seconds]. Old buckets are overwritten in place,
+    so memory stays constant however long the monitor runs.
+    """
+    
+    def __init__(self, width, size):
+        self.width = width
+        self.size = size
+        self.epochs = [-1] * size
+        self.values = [[0, 0, 0.0] for _ in range(size)]
+    
+    def add(self, now, evaluations, hits, seconds):
+        epoch = int(now // self.width)
+        slot = epoch % self.size
+        bucket = self.values[slot]
+        if self.epochs[slot] != epoch:
+            # Slot still holds an expired bucket, reuse it
+            self.epochs[slot] = epoch
+            bucket[0], bucket[1], bucket[2] = 0, 0, 0.0
+        bucket[0] += evaluations
+        bucket[1] += hits
+        bucket[2] += seconds
+    
+    def series(self, now):
+        """Buckets from oldest to newest, ending with the current one"""
+        current = int(now // self.width)
+        result = []
+        for epoch in range(current - self.size + 1, current + 1):
+            slot = epoch % self.size
+            if self.epochs[slot] == epoch:
+                result.append(list(self.values[slot]))
+            else:
+                result.append([0, 0, 0.0])
+        return result
+    
+    def load(self, series, saved_at):
+        """Restore buckets written by series() at time saved_at"""
+        current = int(saved_at // self.width)
+        series = series[-self.size:]
+        first = current - len(series) + 1
+        for offset, values in enumerate(series):
+            epoch = first + offset
+            slot = epoch % self.size
+            self.epochs[slot] = epoch
+            self.values[slot] = [int(values[0]), int(values[1]), float(values[2])]
+
+
+class MatchStats:
+    """
+    Per channel and keyword counts of evaluations, hits and cumulative
+    match time, kept as lifetime totals plus minute/hour/day rollups.
+    
+    record_scan() runs for every message, so it only bumps per-channel
+    counters; they are folded into the rollups by rollup(), which runs
+    when the minute changes and before every snapshot.
+    """
+    
+    def __init__(self):
+        # (channel, keyword) -> {'total': [evaluations, hits, seconds], rollup name -> RollupSeries}
+        self.entries = {}
+        # channel -> counters since the last rollup, see record_scan()
+        self.pending = {}
+        self.pending_minute = None
+    
+    def _entry(self, channel, keyword):
+        entry = self.entries.get((channel, keyword))
+        if entry is None:
+            entry = {'total': [0, 0, 0.0]}
+            for name, width, size in STATS_ROLLUPS:
+                entry[name] = RollupSeries(width, size)
+            self.entries[(channel, keyword)] = entry
+        return entry
+    
+    def record(self, channel, keyword, evaluations, hits, seconds, now=None):
+        if now is None:
+            now = time.time()
+        entry = self._entry(channel, keyword)
+        total = entry['total']
+        total[0] += evaluations
+        total[1] += hits
+        total[2] += seconds
+        for name, _, _ in STATS_ROLLUPS:
+            entry[name].add(now, evaluations, hits, seconds)
+    
+    def record_scan(self, matcher, hits, costs, started, matched, now=None):
+        """
+        Account one message run through a channel's KeywordMatcher.
+        started is the perf_counter() value when handling began; the
+        channel total includes the time spent in here as well.
+        """
+        if now is None:
+            now = time.time()
+        minute = int(now // 60)
+        if minute != self.pending_minute:
+            self.rollup()
+            self.pending_minute = minute
+        
+        pending = self.pending.get(matcher.name)
+        if pending is None or pending['matcher'] is not matcher:
+            pending = self.pending[matcher.name] = {
+                'matcher': matcher, 'evaluations': 0, 'matched': 0,
+                'elapsed': 0.0, 'hits': {}, 'costs': {},
+            }
+        pending['evaluations'] += 1
+        if matched:
+            pending['matched'] += 1
+        pending_hits = pending['hits']
+        for pid in hits:
+            pending_hits[pid] = pending_hits.get(pid, 0) + 1
+        pending_costs = pending['costs']
+        for key, seconds in costs.items():
+            pending_costs[key] = pending_costs.get(key, 0.0) + seconds
+        pending['elapsed'] += time.perf_counter() - started
+    
+    def rollup(self):
+        """Fold the counters gathered by record_scan() into totals and rollups"""
+        if self.pending_minute is None:
+            return
+        now = self.pending_minute * 60
+        for channel, pending in self.pending.items():
+            matcher = pending['matcher']
+            evaluations = pending['evaluations']
+            hits = pending['hits']
+            costs = pending['costs']
+            for pid, key in enumerate(matcher.stat_keys):
+                self.record(channel, key, evaluations, hits.get(pid, 0), costs.get(pid, 0.0), now)
+            for segment, key in matcher.scan_stat_keys.items():
+                self.record(channel, key, evaluations, 0, costs.get(segment, 0.0), now)
+            self.record(channel, CHANNEL_TOTAL, evaluations, pending['matched'], pending['elapsed'], now)
+        self.pending = {}
+    
+    def snapshot(self, now=None):
+        """JSON-serializable view of all stats"""
+        if now is None:
+            now = time.time()
+        self.rollup()
+        channels = {}
+        for (channel, keyword), entry in self.entries.items():
+            item = {'total': list(entry['total'])}
+            for name, _, _ in STATS_ROLLUPS:
+                item[name] = entry[name].series(now)
+            channels.setdefault(channel, {})[keyword] = item
+        return {
+            'updated': now,
+            'rollups': {name: [width, size] for name, width, size in STATS_ROLLUPS},
+            'channels': channels,
+        }
+    
+    def restore(self, data, keep=None):
+        """
+        Load a snapshot() so rollups survive bot restarts. If keep is given,
+        only (channel, keyword) pairs in it are restored, which drops stats
+        of keywords removed from the config.
+        """
+        saved_at = data.get('updated')
+        if not saved_at:
+            return
+        for channel, keywords in data.get('channels', {}).items():
+            for keyword, item in keywords.items():
+                if keep is not None and (channel, keyword) not in keep:
+                    continue
+                entry = self._entry(channel, keyword)
+                entry['total'] = list(item.get('total', entry['total']))
+                for name, _, _ in STATS_ROLLUPS:
+                    if name in item:
+                        entry[name].load(item[name], saved_at)
+    
+
+
+MATCH_STATS = MatchStats()
+
+
+def load_match_stats(matchers, path=STATS_FILE):
+    """Restore match stats written by a previous run for the current keywords"""
+    if not os.path.exists(path):
+        return
+    keep = set()
+    for matcher in matchers:
+        keep.add((matcher.name, CHANNEL_TOTAL))
+        keep.update((matcher.name, key) for key in matcher.stat_keys)
+        keep.update((matcher.name, key) for key in matcher.scan_stat_keys.values())
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            MATCH_STATS.restore(json.load(f), keep)
+    except Exception as e:
+        logger.warning(f"Failed to load {path}: {e}")
+
+
+def save_stats(data, path=STATS_FILE):
+    """Write match and proxy stats for the web console"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def flush_match_stats():
+    """Periodically write match and proxy stats for the web console"""
+    while True:
+        await asyncio.sleep(STATS_FLUSH_INTERVAL)
+        try:
+            # Snapshot on the event loop so it never races with record_scan();
+            # only the file write happens in a thread
+            data = MATCH_STATS.snapshot()
+            data['proxies'] = PROXY_POOL.snapshot()
+            await asyncio.to_thread(save_stats, data)
+        except Exception as e:
+            logger.error(f"Failed to write {STATS_FILE}: {e}")
 
 
 def parse_message_format(text, entities=None):
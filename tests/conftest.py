@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def monitor(tmp_path_factory):
+    """Import monitor_tg with dummy credentials, no .env proxy and the session file in a temp dir"""
+    mp = pytest.MonkeyPatch()
+    mp.setenv('TG_API_ID', '12345')
+    mp.setenv('TG_API_HASH', 'test')
+    for name in ('TG_PROXY_TYPE', 'TG_PROXY_HOST', 'TG_PROXY_PORT'):
+        mp.delenv(name, raising=False)
+    mp.chdir(tmp_path_factory.mktemp('session'))
+    mp.syspath_prepend(ROOT)
+    sys.modules.pop('monitor_tg', None)
+    import monitor_tg
+    yield monitor_tg
+    mp.undo()
@@ -0,0 +1,228 @@
+import random
+import re
+
+import pytest
+from telethon.tl.types import MessageEntityTextUrl, MessageEntityUrl
+
+
+def match(monitor, keywords, text, entities_text=None, default_scope='title'):
+    """Matched keyword of a single subscriber, or None"""
+    matcher = monitor.KeywordMatcher({'me': keywords}, default_scope)
+    segments = monitor.extract_segments(text, entities_text, matcher.segments)
+    return matcher.resolve(matcher.scan(segments)).get('me')
+
+
+def legacy_match_keywords(text, keywords):
+    """match_keywords() as it was before the compiled matcher, for equivalence checks"""
+    text_lower = text.lower()
+    exclusions = []
+    positive_keywords = []
+    for kw in keywords:
+        kw = kw.strip()
+        if not kw:
+            continue
+        if kw.startswith('-'):
+            exclusions.append(kw[1:].strip())
+        else:
+            positive_keywords.append(kw)
+    for excl in exclusions:
+        if legacy_is_keyword_match(text, text_lower, excl):
+            return None
+    for kw in positive_keywords:
+        if legacy_is_keyword_match(text, text_lower, kw):
+            return kw
+    return None
+
+
+def legacy_is_keyword_match(text, text_lower, keyword):
+    keyword = keyword.strip()
+    if keyword.startswith('/') and ('/' in keyword[1:]):
+        last_slash = keyword.rfind('/')
+        if last_slash > 0:
+            pattern = keyword[1:last_slash]
+            flags_str = keyword[last_slash+1:]
+            flags = 0
+            if 'i' in flags_str:
+                flags |= re.IGNORECASE
+            if 's' in flags_str:
+                flags |= re.DOTALL
+            if 'm' in flags_str:
+                flags |= re.MULTILINE
+            try:
+                if re.search(pattern, text, flags):
+                    return True
+            except re.error:
+                pass
+            return False
+    keyword_lower = keyword.lower()
+    if re.search(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]', keyword):
+        return keyword_lower in text_lower
+    try:
+        if re.search(r'\b' + re.escape(keyword) + r'\b', text, re.IGNORECASE):
+            return True
+    except re.error:
+        return keyword_lower in text_lower
+    return False
+
+
+@pytest.fixture
+def limits(monitor, monkeypatch):
+    """Set segment caps as config.json would; restored after the test"""
+    def apply(**caps):
+        conf = {f'max_{segment}_length': value for segment, value in caps.items()}
+        monkeypatch.setattr(monitor, 'MATCH_LIMITS', monitor.load_match_limits({'match': conf}))
+    monkeypatch.setattr(monitor, 'MATCH_LIMITS', dict(monitor.DEFAULT_MATCH_LIMITS))
+    return apply
+
+
+# ========== Keyword syntax ==========
+
+@pytest.mark.parametrize('text, expected', [
+    ('AI 服务器特价', 'AI'),
+    ('new (ai) model', 'AI'),
+    ('air purifier', None),
+    ('fair deal', None),
+    ('AI_bot online', None),
+    ('AI2 released', None),
+])
+def test_word_boundary(monitor, limits, text, expected):
+    assert match(monitor, ['AI'], text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('foo_bar released', 'foo_bar'),
+    ('foo_barx released', None),
+    ('xfoo_bar released', None),
+])
+def test_word_boundary_with_underscore(monitor, limits, text, expected):
+    assert match(monitor, ['foo_bar'], text) == expected
+
+
+def test_word_boundary_short_keyword_inside_identifier(monitor, limits):
+    assert match(monitor, ['foo'], 'foo_bar released') is None
+
+
+@pytest.mark.parametrize('text', ['learn C++11 today', 'C++ 教程', 'c++x', 'C++'])
+def test_word_boundary_non_word_edges_follow_regex(monitor, limits, text):
+    # \b after '+' needs a word character next, exactly like re's \b
+    expected = 'C++' if re.search(r'\bC\+\+\b', text, re.IGNORECASE) else None
+    assert match(monitor, ['C++'], text) == expected
+
+
+def test_cjk_substring(monitor, limits):
+    assert match(monitor, ['出'], '出售一台服务器') == '出'
+    assert match(monitor, ['补货'], '今日补货通知') == '补货'
+    assert match(monitor, ['福利AI'], '福利ai来了') == '福利AI'
+    assert match(monitor, ['出'], '今日补货') is None
+
+
+def test_overlapping_keywords_first_in_config_order(monitor, limits):
+    assert match(monitor, ['讯', '快讯'], '快讯来了') == '讯'
+    assert match(monitor, ['快讯', '讯'], '快讯来了') == '快讯'
+
+
+def test_regex_with_flags(monitor, limits):
+    assert match(monitor, ['/gpt-?4/i'], 'New GPT4 model') == '/gpt-?4/i'
+    assert match(monitor, ['/gpt-?4/'], 'New GPT4 model') is None
+    assert match(monitor, [r'/\bVPS\b/i'], 'cheap vps deal') == r'/\bVPS\b/i'
+
+
+def test_invalid_regex_is_skipped(monitor, limits):
+    assert monitor.parse_keyword('/(/') is None
+    assert match(monitor, ['/(/', 'AI'], 'AI (news') == 'AI'
+
+
+def test_exclusion(monitor, limits):
+    assert match(monitor, ['AI', '-iPhone'], 'AI on iPhone') is None
+    assert match(monitor, ['AI', '-iPhone'], 'AI on Android') == 'AI'
+
+
+# ========== Scopes ==========
+
+def test_scope_prefixes(monitor, limits):
+    keywords = ['[body]补货', '[any]kimi']
+    assert match(monitor, keywords, '标题\n今日补货') == '补货'
+    assert match(monitor, keywords, '补货\n正文') is None
+    assert match(monitor, keywords, '标题\nKIMI 上线') == 'kimi'
+    assert match(monitor, keywords, 'Kimi 上线\n正文') == 'kimi'
+
+
+def test_scoped_exclusion(monitor, limits):
+    keywords = ['AI', '[body]-iPhone']
+    assert match(monitor, keywords, 'AI news\nfor iPhone') is None
+    assert match(monitor, keywords, 'AI news on iPhone\nbody') == 'AI'
+
+
+def test_default_scope_is_title(monitor, limits):
+    assert match(monitor, ['AI'], 'title\nAI in body') is None
+    assert match(monitor, ['AI'], 'title\nAI in body', default_scope='body') == 'AI'
+    assert match(monitor, ['[title]AI'], 'AI title\nbody', default_scope='body') == 'AI'
+
+
+def test_url_scope(monitor, limits):
+    entities_text = [
+        (MessageEntityTextUrl(offset=0, length=4, url='https://www.nodeseek.com/post-1'), 'link'),
+        (MessageEntityUrl(offset=5, length=18), 'https://linux.do/t'),
+    ]
+    text = 'link https://linux.do/t'
+    assert match(monitor, ['[url]nodeseek.com'], text, entities_text) == 'nodeseek.com'
+    assert match(monitor, ['[url]linux.do'], text, entities_text) == 'linux.do'
+    assert match(monitor, ['[url]link'], text, entities_text) == 'link'
+    assert match(monitor, ['nodeseek.com'], text, entities_text) is None
+
+
+def test_only_needed_segments_are_extracted(monitor, limits):
+    matcher = monitor.KeywordMatcher({'me': ['AI', '[body]x']})
+    assert matcher.segments == {'title', 'body'}
+    assert set(monitor.extract_segments('a\nb', None, matcher.segments)) == {'title', 'body'}
+
+
+# ========== Length caps ==========
+
+def test_title_unlimited_by_default(monitor, limits):
+    assert match(monitor, ['AI'], 'x' * 300 + ' AI\nbody') == 'AI'
+
+
+def test_title_cap(monitor, limits):
+    limits(title=10)
+    assert match(monitor, ['AI'], 'x' * 300 + ' AI\nbody') is None
+    assert match(monitor, ['AI'], 'AI ' + 'x' * 300) == 'AI'
+
+
+def test_body_cap(monitor, limits):
+    text = 'title\n' + 'y' * 5000 + ' 补货'
+    assert match(monitor, ['[body]补货'], text) is None
+    limits(body=0)
+    assert match(monitor, ['[body]补货'], text) == '补货'
+    limits(body=10)
+    assert match(monitor, ['[body]补货'], 'title\n补货' + 'y' * 100) == '补货'
+
+
+def test_url_cap(monitor, limits):
+    entities_text = [(MessageEntityTextUrl(offset=0, length=4, url='https://x.com/' + 'a' * 3000 + '/nodeseek.com'), 'link')]
+    assert match(monitor, ['[url]nodeseek.com'], 'link', entities_text) is None
+    limits(url=0)
+    assert match(monitor, ['[url]nodeseek.com'], 'link', entities_text) == 'nodeseek.com'
+
+
+def test_zero_means_unlimited(monitor, limits):
+    limits(title=0, body=0, url=0)
+    assert monitor.MATCH_LIMITS == {'title': None, 'body': None, 'url': None}
+
+
+# ========== Equivalence with the old title-only matcher ==========
+
+def test_equivalent_to_legacy_title_matching(monitor, limits):
+    rng = random.Random(20261019)
+    vocabulary = ['AI', 'ai', 'air', 'fair', 'KIMI', 'kimi', '出', '出售', '快讯', '讯', '特价',
+                  'C++', 'foo_bar', 'foo', 'GPT4', 'gpt-4', 'iPhone', 'VPS', '模型', '_', '-', '(', ')']
+    keyword_pool = ['AI', 'KIMI', '出', '快讯', '讯', '特价', 'C++', 'foo', 'foo_bar', 'VPS', '模型',
+                    '-iPhone', '-air', '-出售', '/gpt-?4/i', r'/\bVPS\b/', '/^AI/m']
+
+    for _ in range(3000):
+        keywords = rng.sample(keyword_pool, rng.randint(1, 6))
+        title = ''.join(rng.choice(vocabulary) + rng.choice(['', ' ', ',']) for _ in range(rng.randint(0, 8)))
+        body = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(0, 5)))
+        text = f'{title}\n{body}' if body else title
+        expected = legacy_match_keywords(text.split('\n')[0], keywords)
+        assert match(monitor, keywords, text) == expected, (keywords, text)
@@ -0,0 +1,290 @@
+import asyncio
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+
+
+# ========== Local stand-ins ==========
+
+class _TargetHandler(BaseHTTPRequestHandler):
+    """Plain HTTP site the proxies forward to"""
+
+    def _reply(self, body=b'ok'):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_GET(self):
+        self.wfile.write(self._reply())
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.wfile.write(self._reply())
+
+    def do_HEAD(self):
+        self._reply()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ProxyHandler(socketserver.StreamRequestHandler):
+    """HTTP forward proxy with CONNECT support"""
+
+    def handle(self):
+        request_line = self.rfile.readline().decode('latin-1').strip()
+        headers = []
+        while True:
+            line = self.rfile.readline().decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            headers.append(line.strip())
+
+        self.server.requests += 1
+        if self.server.down:
+            # Drop the connection without answering
+            return
+        time.sleep(self.server.delay)
+
+        method, target, _ = request_line.split()
+        if method == 'CONNECT':
+            self._tunnel(target)
+        else:
+            self._forward(method, target, headers)
+
+    def _tunnel(self, target):
+        host, port = target.rsplit(':', 1)
+        try:
+            upstream = socket.create_connection((host, int(port)), timeout=5)
+        except OSError:
+            self.wfile.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n')
+            return
+        self.wfile.write(b'HTTP/1.1 200 Connection established\r\n\r\n')
+        self.wfile.flush()
+        threading.Thread(target=_pipe, args=(upstream, self.connection), daemon=True).start()
+        _pipe(self.connection, upstream)
+
+    def _forward(self, method, target, headers):
+        parts = urlsplit(target)
+        try:
+            upstream = socket.create_connection((parts.hostname, parts.port or 80), timeout=5)
+        except OSError:
+            self.wfile.write(b'HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n')
+            return
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        kept = [h for h in headers if not h.lower().startswith(('connection', 'proxy-connection'))]
+        head = f'{method} {path} HTTP/1.0\r\n' + ''.join(f'{h}\r\n' for h in kept) + 'Connection: close\r\n\r\n'
+        upstream.sendall(head.encode('latin-1'))
+        length = next((int(h.split(':', 1)[1]) for h in kept if h.lower().startswith('content-length')), 0)
+        if length:
+            upstream.sendall(self.rfile.read(length))
+        _pipe(upstream, self.connection)
+        upstream.close()
+
+
+def _pipe(source, sink):
+    try:
+        while True:
+            data = source.recv(65536)
+            if not data:
+                break
+            sink.sendall(data)
+    except OSError:
+        pass
+
+
+class StandInProxy(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), _ProxyHandler)
+        self.delay = delay
+        self.down = False
+        self.requests = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+def closed_port():
+    """A local port with nothing listening on it"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ========== Fixtures ==========
+
+@pytest.fixture(scope='module')
+def target():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TargetHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+
+
+@pytest.fixture
+def proxies():
+    started = []
+
+    def start(delay=0.0):
+        proxy = StandInProxy(delay)
+        started.append(proxy)
+        return proxy
+
+    yield start
+    for proxy in started:
+        proxy.shutdown()
+        proxy.server_close()
+
+
+@pytest.fixture
+def pool(monitor, target, monkeypatch):
+    monkeypatch.setattr(monitor, 'PROXY_CHECK_URL', target)
+    monkeypatch.setattr(monitor, 'PROXY_CHECK_TIMEOUT', 2)
+    pool = monitor.ProxyPool()
+    monkeypatch.setattr(monitor, 'PROXY_POOL', pool)
+    return pool
+
+
+# ========== Tests ==========
+
+def test_ranked_by_probe_latency(monitor, pool, proxies):
+    fast = monitor.Proxy.from_url(proxies(0.0).url)
+    slow = monitor.Proxy.from_url(proxies(0.2).url)
+    dead = monitor.Proxy('http', '127.0.0.1', closed_port())
+    pool.proxies = [dead, slow, fast]
+
+    asyncio.run(pool.check_all())
+
+    assert pool.ranked() == [fast, slow, dead]
+    assert pool.best() is fast
+    assert fast.latency < slow.latency
+    assert dead.latency is None and dead.failures == 1
+
+
+def test_unhealthy_after_max_failures(monitor, pool, proxies):
+    live = monitor.Proxy.from_url(proxies().url)
+    dead = monitor.Proxy('http', '127.0.0.1', closed_port())
+    pool.proxies = [dead, live]
+
+    for attempt in range(monitor.PROXY_MAX_FAILURES):
+        assert dead.healthy
+        pool.probe(dead)
+    pool.probe(live)
+
+    assert not dead.healthy
+    assert dead.last_error
+    assert pool.ranked() == [live, dead]
+
+
+def test_recovers_after_successful_probe(monitor, pool, proxies):
+    server = proxies()
+    proxy = monitor.Proxy.from_url(server.url)
+    pool.proxies = [proxy]
+
+    server.down = True
+    for attempt in range(monitor.PROXY_MAX_FAILURES):
+        pool.probe(proxy)
+    assert not proxy.healthy
+
+    server.down = False
+    pool.probe(proxy)
+    assert proxy.healthy
+    assert proxy.consecutive_failures == 0
+    assert proxy.latency is not None
+
+
+def test_failover_falls_through_to_next_proxy(monitor, pool, proxies, target):
+    server = proxies()
+    live = monitor.Proxy.from_url(server.url)
+    dead = monitor.Proxy('http', '127.0.0.1', closed_port())
+    # Make the dead proxy look fastest so it is tried first
+    dead.latency, live.latency = 0.001, 0.1
+    pool.proxies = [live, dead]
+
+    response = monitor.request_with_failover(requests.get, target, timeout=5)
+
+    assert response.status_code == 200
+    assert server.requests == 1
+    assert dead.failures == 1
+    assert live.failures == 0 and live.successes == 1
+
+
+def test_failover_raises_when_all_proxies_are_down(monitor, pool, target):
+    pool.proxies = [monitor.Proxy('http', '127.0.0.1', closed_port()) for _ in range(2)]
+
+    with pytest.raises(requests.exceptions.ProxyError):
+        monitor.request_with_failover(requests.get, target, timeout=5)
+    assert all(p.failures == 1 for p in pool.proxies)
+
+
+def test_target_errors_are_not_blamed_on_proxy(monitor, pool, proxies):
+    first, second = proxies(), proxies()
+    first_proxy = monitor.Proxy.from_url(first.url)
+    second_proxy = monitor.Proxy.from_url(second.url)
+    first_proxy.latency, second_proxy.latency = 0.001, 0.1
+    pool.proxies = [first_proxy, second_proxy]
+
+    # The proxy is fine, but the site behind it is down
+    url = f'https://127.0.0.1:{closed_port()}/'
+    with pytest.raises(requests.exceptions.ProxyError) as excinfo:
+        monitor.request_with_failover(requests.get, url, timeout=5)
+
+    assert not monitor.is_proxy_failure(excinfo.value, first_proxy, url)
+    assert first_proxy.failures == 0 and first_proxy.healthy
+    # No retry through the next proxy
+    assert second.requests == 0
+
+
+def test_dead_socks_proxy_fails_over(monitor, pool, proxies, target):
+    server = proxies()
+    live = monitor.Proxy.from_url(server.url)
+    dead = monitor.Proxy('socks5', '127.0.0.1', closed_port())
+    dead.latency, live.latency = 0.001, 0.1
+    pool.proxies = [live, dead]
+
+    response = monitor.request_with_failover(requests.get, target, timeout=5)
+
+    assert response.status_code == 200
+    assert dead.failures == 1
+    assert live.successes == 1
+
+
+def test_slow_proxy_read_timeout_is_not_retried_by_default(monitor, pool, proxies, target):
+    slow_server, fast_server = proxies(delay=1.0), proxies()
+    slow = monitor.Proxy.from_url(slow_server.url)
+    fast = monitor.Proxy.from_url(fast_server.url)
+    slow.latency, fast.latency = 0.001, 0.1
+    pool.proxies = [slow, fast]
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        monitor.request_with_failover(requests.get, target, timeout=(2, 0.3))
+
+    assert slow.failures == 0
+    assert fast_server.requests == 0
+
+
+def test_slow_proxy_read_timeout_retried_when_requested(monitor, pool, proxies, target):
+    slow_server, fast_server = proxies(delay=1.0), proxies()
+    slow = monitor.Proxy.from_url(slow_server.url)
+    fast = monitor.Proxy.from_url(fast_server.url)
+    slow.latency, fast.latency = 0.001, 0.1
+    pool.proxies = [slow, fast]
+
+    response = monitor.request_with_failover(
+        requests.post, target, retry_read_timeout=True, json={'text': 'hi'}, timeout=(2, 0.3)
+    )
+
+    assert response.status_code == 200
+    assert slow.failures == 1
+    assert fast.successes == 1 and fast_server.requests == 1
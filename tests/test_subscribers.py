@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+def recipients(matcher, text):
+    return matcher.resolve(matcher.scan({'title': text}))
+
+
+# ========== Shared matcher ==========
+
+def test_exclusion_only_affects_its_own_subscriber(monitor):
+    matcher = monitor.KeywordMatcher({
+        'default': ['AI'],
+        'alice': ['AI', '-iPhone'],
+    })
+
+    assert recipients(matcher, 'AI on iPhone') == {'default': 'AI'}
+    assert recipients(matcher, 'AI on Android') == {'default': 'AI', 'alice': 'AI'}
+
+
+def test_shared_keyword_compiled_once(monitor):
+    matcher = monitor.KeywordMatcher({
+        'default': ['AI', '特价'],
+        'alice': ['ai'],
+        'bob': ['特价'],
+    })
+
+    assert len(matcher.patterns) == 2
+    subscribers = {matcher.pattern_name(pid): subs for pid, subs in matcher.index.items()}
+    assert subscribers == {'[title]AI': ['default', 'alice'], '[title]特价': ['default', 'bob']}
+    # Shared keywords keep the spelling of their first occurrence
+    assert recipients(matcher, 'AI 特价') == {'default': 'AI', 'alice': 'AI', 'bob': '特价'}
+
+
+# ========== Config loading ==========
+
+def test_load_subscriptions(monitor, monkeypatch):
+    monkeypatch.setattr(monitor, 'BOT_CHAT_ID', '100')
+    config = {
+        'channels': [
+            {'id': 'nodeseekc', 'keywords': ['特价'], 'enabled': True},
+            {'id': 'paused', 'keywords': ['AI'], 'enabled': False},
+        ],
+        'subscribers': [
+            {'name': 'alice', 'chat_id': '200', 'channels': {
+                'nodeseekc': ['补货'], 'paused': ['AI'], 'unknown': ['AI'],
+            }},
+            {'name': 'bob', 'chat_id': '300', 'enabled': False, 'channels': {'nodeseekc': ['AI']}},
+            {'name': 'carol', 'channels': {'nodeseekc': ['AI']}},
+        ],
+    }
+
+    subscriptions, chat_ids = monitor.load_subscriptions(config)
+
+    assert subscriptions == {'nodeseekc': {'default': ['特价'], 'alice': ['补货']}}
+    assert chat_ids == {'default': '100', 'alice': '200'}
+
+
+# ========== Delivery ==========
+
+def post(text):
+    return SimpleNamespace(id=1, message=text, grouped_id=None, entities=None, get_entities_text=lambda: [])
+
+
+@pytest.fixture
+def sent(monitor, monkeypatch):
+    messages = []
+    monkeypatch.setattr(monitor, 'HANDLE_EDITS', False)
+    monkeypatch.setattr(monitor, 'MATCH_STATS', monitor.MatchStats())
+    monkeypatch.setattr(monitor, 'send_bot_message', lambda text, chat_id=None: messages.append((chat_id, text)))
+    return messages
+
+
+def test_subscribers_sharing_a_chat_get_one_notification(monitor, monkeypatch, sent):
+    matcher = monitor.KeywordMatcher({'default': ['特价'], 'alice': ['AI'], 'bob': ['ai'], 'carol': ['AI']})
+    monkeypatch.setattr(monitor, 'CHANNEL_CONFIGS', {-1001: matcher})
+    monkeypatch.setattr(monitor, 'SUBSCRIBERS', {'default': '100', 'alice': '200', 'bob': '200', 'carol': '300'})
+
+    asyncio.run(monitor.process_post(-1001, [post('AI 服务器')]))
+
+    assert sorted(chat_id for chat_id, text in sent) == ['200', '300']
+    assert any(chat_id == '200' and '#AI' in text for chat_id, text in sent)
+
+
+def test_no_notification_without_match(monitor, monkeypatch, sent):
+    monkeypatch.setattr(monitor, 'CHANNEL_CONFIGS', {-1001: monitor.KeywordMatcher({'default': ['特价']})})
+    monkeypatch.setattr(monitor, 'SUBSCRIBERS', {'default': '100'})
+
+    asyncio.run(monitor.process_post(-1001, [post('AI 服务器')]))
+
+    assert sent == []
@@ -26,12 +26,14 @@ templates = Jinja2Templates(directory="templates")
 bot_process = None
 BOT_SCRIPT = "monitor_tg.py"
 LOG_FILE = "bot.log"
+STATS_FILE = "stats.json"
 ENV_FILE = ".env"
 
 class ChannelConfig(BaseModel):
     id: str
     keywords: str # Comma separated string for UI
     enabled: bool
+    scope: str = "title" # Default match scope: title / body / url / any
 
 class ConfigUpdate(BaseModel):
     # .env settings
@@ -177,6 +179,18 @@ async def api_logs():
     except Exception as e:
         return {"logs": f"Error reading logs: {e}"}
 
+@app.get("/api/stats")
+async def api_stats(request: Request):
+    require_auth(request)
+    # Written periodically by the bot process
+    if not os.path.exists(STATS_FILE):
+        return {"updated": None, "rollups": {}, "channels": {}}
+    try:
+        with open(STATS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read {STATS_FILE}: {e}")
+
 @app.get("/api/config")
 async def api_get_config(request: Request):
     require_auth(request)
@@ -195,7 +209,8 @@ async def api_get_config(request: Request):
                     channels.append({
                         "id": c.get('id', ''),
                         "keywords": ",".join(c.get('keywords', [])),
-                        "enabled": c.get('enabled', True)
+                        "enabled": c.get('enabled', True),
+                        "scope": c.get('scope', 'title')
                     })
         except Exception as e:
             print(f"Error reading config.json: {e}")
@@ -213,20 +228,33 @@ async def api_update_config(request: Request, config: ConfigUpdate):
     set_key(ENV_FILE, "TELEGRAM_BOT_TOKEN", config.telegram_bot_token)
     set_key(ENV_FILE, "TELEGRAM_CHAT_ID", config.telegram_chat_id)
     
-    # 2. Update config.json
+    # 2. Update config.json, keeping settings the UI does not edit
+    data = {}
+    if os.path.exists('config.json'):
+        try:
+            with open('config.json', 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading config.json: {e}")
+    existing = {c.get('id'): c for c in data.get('channels', [])}
+    
     channels_data = []
     for c in config.channels:
         # Split keywords string back to list
         kw_list = [k.strip() for k in c.keywords.split(',') if k.strip()]
-        channels_data.append({
+        channel = dict(existing.get(c.id, {}))
+        channel.update({
             "id": c.id,
             "keywords": kw_list,
-            "enabled": c.enabled
+            "enabled": c.enabled,
+            "scope": c.scope
         })
+        channels_data.append(channel)
+    data["channels"] = channels_data
     
     try:
         with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump({"channels": channels_data}, f, indent=2, ensure_ascii=False)
+            json.dump(data, f, indent=2, ensure_ascii=False)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to write config.json: {e}")
 